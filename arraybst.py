@@ -0,0 +1,355 @@
+"""
+File: arraybst.py
+"""
+
+from abstractcollection import AbstractCollection
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
+
+
+def _find_many_kernel(left, right, data, root, queries, hits):
+    '''
+    Marks hits[i] True for every queries[i] present in the tree
+    described by the parallel arrays.  Compiled with numba when it is
+    available; the loop is iterative on purpose, since numba handles a
+    flat integer-indexed while-loop far better than recursion or
+    linked objects.
+    Parameters
+    ----------
+    left, right: int array
+        The child-index arrays, -1 for none.
+    data: array
+        The items, indexed by node number.
+    root: int
+        The index of the root node.
+    queries: array
+        The items to look up.
+    hits: bool array
+        The output array, preallocated to False.
+    '''
+    for i in prange(queries.shape[0]):
+        query = queries[i]
+        index = root
+        while index != -1:
+            node_data = data[index]
+            if query == node_data:
+                hits[i] = True
+                break
+            index = left[index] if query < node_data else right[index]
+
+
+if njit is not None:
+    _find_many_kernel = njit(cache=True, parallel=True)(_find_many_kernel)
+
+
+class ArrayBST(AbstractCollection):
+    """
+    A binary search tree stored as three parallel lists instead of
+    linked node objects.  A node is just an int index: its item lives
+    in _data[index] and its children in _left[index] / _right[index],
+    with -1 as the null sentinel.  The contiguous layout keeps
+    traversals cache-friendly, shrinks the per-node footprint and is
+    the form batch search kernels can run over directly.
+    Attributes
+    ----------
+    _data: list
+        The items, indexed by node number.
+    _left: list
+        The left-child index of every node, -1 for none.
+    _right: list
+        The right-child index of every node, -1 for none.
+    _root: int
+        The index of the root node, -1 for an empty tree.
+    Methods
+    -------
+    inorder()
+        Returns a list of an inorder view of the tree.
+    find(item)
+        Returns the matched item or None.
+    clear()
+        Clears the tree.
+    add(item)
+        Adds the item to the tree.
+    remove(item)
+        Removes the item from the tree.
+    range_find(low, high)
+        Returns the list of items in tree which are between low and high.
+    """
+
+    def __init__(self, source_collection=None) -> None:
+        """
+        Sets the initial state of self, which includes the
+        contents of source_collection, if it's present.
+        Parameters
+        ----------
+        source_collection: iterable
+            The source collection.
+        """
+        self._data = []
+        self._left = []
+        self._right = []
+        self._root = -1
+        self._kernel_arrays = None
+        AbstractCollection.__init__(self, source_collection)
+
+    def __iter__(self) -> iter:
+        """
+        Supports a preorder traversal on a view of self.
+        """
+        stack = [self._root] if self._root != -1 else []
+        while stack:
+            index = stack.pop()
+            yield self._data[index]
+            if self._right[index] != -1:
+                stack.append(self._right[index])
+            if self._left[index] != -1:
+                stack.append(self._left[index])
+
+    def inorder(self) -> list:
+        """
+        Supports an inorder traversal on a view of self.
+        """
+        lyst = []
+        stack = []
+        index = self._root
+        left = self._left
+        while stack or index != -1:
+            if index != -1:
+                stack.append(index)
+                index = left[index]
+            else:
+                index = stack.pop()
+                lyst.append(self._data[index])
+                index = self._right[index]
+        return lyst
+
+    def __contains__(self, item: object) -> bool:
+        """
+        Returns True if target is found or False otherwise.
+        Parameters
+        ----------
+        item: object
+            The item, which needs to be checked.
+        """
+        return self._find_index(item) != -1
+
+    def _find_index(self, item: object) -> int:
+        '''
+        Returns the index of the node holding item, or -1.
+        Parameters
+        ----------
+        item: object
+            The item, which needs to be found.
+        '''
+        data = self._data
+        left = self._left
+        right = self._right
+        index = self._root
+        while index != -1:
+            node_data = data[index]
+            if item == node_data:
+                return index
+            index = left[index] if item < node_data else right[index]
+        return -1
+
+    def find(self, item: object) -> object:
+        """
+        If item matches an item in self, returns the
+        matched item, or None otherwise.
+        Parameters
+        ----------
+        item: object
+            The item, which needs to be found.
+        """
+        index = self._find_index(item)
+        return self._data[index] if index != -1 else None
+
+    def _as_arrays(self) -> tuple:
+        '''
+        Returns the tree as numpy arrays (left, right, data) suitable
+        for the compiled kernel, caching them until the next mutation.
+        Returns None when the items are not numeric scalars: hashing
+        non-numeric keys would not preserve the tree's comparison
+        order, so those trees use the Python search path instead.
+        '''
+        if self._kernel_arrays is None:
+            data = np.asarray(self._data)
+            if data.dtype.kind not in 'iuf':
+                self._kernel_arrays = ()
+            else:
+                self._kernel_arrays = (np.asarray(self._left, dtype=np.int64),
+                                       np.asarray(self._right, dtype=np.int64),
+                                       data)
+        return self._kernel_arrays or None
+
+    def find_many(self, queries) -> list:
+        """
+        Returns a list of booleans telling, for every query, whether it
+        is in the tree.  When numba and numpy are installed and the
+        items are numeric, all queries run through one compiled batch
+        kernel; otherwise each query falls back to the Python search.
+        Parameters
+        ----------
+        queries: iterable
+            The items to look up.
+        """
+        queries = list(queries)
+        if np is not None and njit is not None and self._root != -1:
+            arrays = self._as_arrays()
+            if arrays is not None:
+                left, right, data = arrays
+                try:
+                    query_arr = np.asarray(queries)
+                except (TypeError, ValueError):
+                    query_arr = None
+                if query_arr is not None and query_arr.dtype.kind not in 'iuf':
+                    query_arr = None
+                if query_arr is not None:
+                    # Compare in the promoted type so e.g. float queries
+                    # against an int-keyed tree are not truncated into
+                    # false positives.
+                    common = np.result_type(data.dtype, query_arr.dtype)
+                    query_arr = query_arr.astype(common, copy=False)
+                    data = data.astype(common, copy=False)
+                    hits = np.zeros(len(queries), dtype=np.bool_)
+                    _find_many_kernel(left, right, data, self._root,
+                                      query_arr, hits)
+                    return hits.tolist()
+        return [self._find_index(query) != -1 for query in queries]
+
+    def clear(self) -> None:
+        """
+        Makes self become empty.
+        """
+        self._data = []
+        self._left = []
+        self._right = []
+        self._root = -1
+        self._kernel_arrays = None
+        self._size = 0
+
+    def _new_node(self, item: object) -> int:
+        '''
+        Appends a fresh leaf to the parallel lists and returns
+        its index.
+        Parameters
+        ----------
+        item: object
+            The item stored in the new node.
+        '''
+        index = len(self._data)
+        self._data.append(item)
+        self._left.append(-1)
+        self._right.append(-1)
+        return index
+
+    def add(self, item: object) -> None:
+        """
+        Adds item to the tree.
+        Parameters
+        ----------
+        item: object
+            The added item.
+        """
+        if self._root == -1:
+            self._root = self._new_node(item)
+        else:
+            data = self._data
+            left = self._left
+            right = self._right
+            index = self._root
+            while True:
+                if item < data[index]:
+                    if left[index] == -1:
+                        left[index] = self._new_node(item)
+                        break
+                    index = left[index]
+                elif right[index] == -1:
+                    right[index] = self._new_node(item)
+                    break
+                else:
+                    index = right[index]
+        self._kernel_arrays = None
+        self._size += 1
+
+    def remove(self, item: object) -> object:
+        """
+        Precondition: item is in self.
+        Raises: KeyError if item is not in self.
+        Postcondition: item is removed from self.
+        The node's slot in the parallel lists is left unused; slots are
+        reclaimed only when the tree is cleared.
+        Parameters
+        ----------
+        item: object
+            The removed item.
+        """
+        data = self._data
+        left = self._left
+        right = self._right
+        parent = -1
+        index = self._root
+        while index != -1 and data[index] != item:
+            parent = index
+            index = left[index] if item < data[index] else right[index]
+        if index == -1:
+            raise KeyError("Item not in tree.""")
+        item_removed = data[index]
+
+        if left[index] != -1 and right[index] != -1:
+            max_parent = index
+            max_index = left[index]
+            while right[max_index] != -1:
+                max_parent = max_index
+                max_index = right[max_index]
+            data[index] = data[max_index]
+            if max_parent == index:
+                left[max_parent] = left[max_index]
+            else:
+                right[max_parent] = left[max_index]
+        else:
+            new_child = right[index] if left[index] == -1 else left[index]
+            if parent == -1:
+                self._root = new_child
+            elif left[parent] == index:
+                left[parent] = new_child
+            else:
+                right[parent] = new_child
+
+        self._kernel_arrays = None
+        self._size -= 1
+        return item_removed
+
+    def range_find(self, low: object, high: object) -> list:
+        '''
+        Returns a list of the items in the tree, where low <= item <= high.
+        Parameters
+        ----------
+        low: object
+            The minimum possible item in the returned list.
+        high: object
+            The maximum possible item in the returned list.
+        '''
+        lyst = []
+        stack = []
+        data = self._data
+        index = self._root
+        while stack or index != -1:
+            if index != -1:
+                stack.append(index)
+                index = self._left[index] if low <= data[index] else -1
+            else:
+                index = stack.pop()
+                if low <= data[index] <= high:
+                    lyst.append(data[index])
+                index = self._right[index] if data[index] <= high else -1
+        return lyst
@@ -6,7 +6,11 @@ Author: Ken Lambert
 class BSTNode:
     """Represents a node for a linked binary search tree."""
 
-    def __init__(self, data, left = None, right = None):
+    __slots__ = ('data', 'left', 'right', 'parent', 'height')
+
+    def __init__(self, data, left = None, right = None, parent = None):
         self.data = data
         self.left = left
         self.right = right
+        self.parent = parent
+        self.height = 0
@@ -3,17 +3,22 @@ File: linkedbst.py
 Author: Ken Lambert
 """
 
-from math import log
-from time import time
-from random import choice, shuffle
+from bisect import bisect_left
+from math import log2
+from time import perf_counter
+from random import choices, shuffle
 from abstractcollection import AbstractCollection
 from bstnode import BSTNode
-from linkedstack import LinkedStack
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class LinkedBST(AbstractCollection):
     """
-    An link-based binary search tree implementation.
+    An link-based self-balancing (AVL) binary search tree implementation.
     Attributes
     ----------
     _root: BSTNode
@@ -60,6 +65,9 @@ class LinkedBST(AbstractCollection):
             The source collection.
         """
         self._root = None
+        self._sorted_items = None
+        self._compiled = None
+        self._balance_threshold = None
         AbstractCollection.__init__(self, source_collection)
 
     def __str__(self) -> str:
@@ -68,54 +76,50 @@ class LinkedBST(AbstractCollection):
         90 degrees counterclockwise.
         """
 
-        def recurse(node: BSTNode, level: int) -> str:
-            '''
-            Recursion function to get string representation of the tree.
-            Parameters
-            ----------
-            node: BSTNode
-                The current node.
-            level: int
-                The level of current node.
-            '''
-            strin = ""
-            if node:
-                strin += recurse(node.right, level + 1)
-                strin += "| " * level
-                strin += str(node.data) + "\n"
-                strin += recurse(node.left, level + 1)
-            return strin
-
-        return recurse(self._root, 0)
+        pieces = []
+        stack = [(self._root, 0, False)] if self._root else []
+        while stack:
+            node, level, expanded = stack.pop()
+            if expanded:
+                pieces.append("| " * level)
+                pieces.append(str(node.data))
+                pieces.append("\n")
+            else:
+                if node.left:
+                    stack.append((node.left, level + 1, False))
+                stack.append((node, level, True))
+                if node.right:
+                    stack.append((node.right, level + 1, False))
+        return ''.join(pieces)
 
     def __iter__(self) -> iter:
         """
         Supports a preorder traversal on a view of self.
         """
-        if not self.isEmpty():
-            stack = LinkedStack()
-            stack.push(self._root)
-            while not stack.isEmpty():
-                node = stack.pop()
-                yield node.data
-                if node.right:
-                    stack.push(node.right)
-                if node.left:
-                    stack.push(node.left)
+        stack = [self._root] if self._root else []
+        while stack:
+            node = stack.pop()
+            yield node.data
+            if node.right:
+                stack.append(node.right)
+            if node.left:
+                stack.append(node.left)
 
     def inorder(self) -> list:
         """
         Supports an inorder traversal on a view of self.
         """
-        lyst = list()
-
-        def recurse(node):
+        lyst = []
+        stack = []
+        node = self._root
+        while stack or node:
             if node:
-                recurse(node.left)
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
                 lyst.append(node.data)
-                recurse(node.right)
-
-        recurse(self._root)
+                node = node.right
         return lyst
 
     def __contains__(self, item: object) -> bool:
@@ -138,62 +142,245 @@ class LinkedBST(AbstractCollection):
             The item, which needs to be found.
         """
 
-        def recurse(node: BSTNode) -> BSTNode:
-            '''
-            Recursion function for finding the needed item.
-            Parameters
-            ----------
-            node: BSTNode
-                The current node.
-            '''
-            if node is None:
-                return None
-            if item == node.data:
-                return node.data
-            if item < node.data:
-                return recurse(node.left)
-            return recurse(node.right)
+        if self._compiled is not None:
+            data, left, right = self._compiled
+            index = 0
+            while index != -1:
+                node_data = data[index]
+                if item == node_data:
+                    return node_data
+                index = left[index] if item < node_data else right[index]
+            return None
+        probe = self._root
+        while probe is not None:
+            data = probe.data
+            if item == data:
+                return data
+            probe = probe.left if item < data else probe.right
+        return None
 
-        return recurse(self._root)
+    def _compile(self) -> None:
+        '''
+        Flattens the tree into three parallel lists (data, left, right)
+        of child indices, numbered in depth-first preorder so a node's
+        left child sits right next to it.  find() then walks the
+        contiguous arrays instead of chasing node objects scattered
+        around the heap.  Rebuilt by rebalance(); any mutation drops it.
+        '''
+        data = []
+        left_code = []
+        right_code = []
+        if self._root:
+            stack = [(self._root, -1, 'L')]
+            while stack:
+                node, parent_index, side = stack.pop()
+                index = len(data)
+                data.append(node.data)
+                left_code.append(-1)
+                right_code.append(-1)
+                if parent_index != -1:
+                    if side == 'L':
+                        left_code[parent_index] = index
+                    else:
+                        right_code[parent_index] = index
+                if node.right:
+                    stack.append((node.right, index, 'R'))
+                if node.left:
+                    stack.append((node.left, index, 'L'))
+        self._compiled = (data, left_code, right_code) if data else None
+
+    def find_many(self, queries) -> list:
+        """
+        Returns a list of booleans telling, for every query, whether it
+        is in the tree.  All queries are answered against a cached
+        sorted snapshot of the contents: a single numpy searchsorted
+        call when numpy is installed, a bisect probe per query
+        otherwise.  The snapshot is rebuilt lazily after add, remove
+        or clear.
+        Parameters
+        ----------
+        queries: iterable
+            The items to look up.
+        """
+        queries = list(queries)
+        if self._sorted_items is None:
+            items = self.inorder()
+            if np is not None and items:
+                items = np.asarray(items)
+            self._sorted_items = items
+        items = self._sorted_items
+        if not len(items):
+            return [False] * len(queries)
+        if np is not None:
+            indexes = np.searchsorted(items, queries)
+            clipped = np.minimum(indexes, len(items) - 1)
+            hits = (indexes < len(items)) & (items[clipped] == np.asarray(queries))
+            return hits.tolist()
+        hits = []
+        for query in queries:
+            index = bisect_left(items, query)
+            hits.append(index < len(items) and items[index] == query)
+        return hits
 
     def clear(self) -> None:
         """
         Makes self become empty.
         """
         self._root = None
+        self._sorted_items = None
+        self._compiled = None
         self._size = 0
 
+    @staticmethod
+    def _height_of(node: BSTNode) -> int:
+        '''
+        Returns the cached height of node, or -1 for an empty subtree.
+        Parameters
+        ----------
+        node: BSTNode
+            The node, possibly None.
+        '''
+        return node.height if node else -1
+
+    def _update_height(self, node: BSTNode) -> None:
+        '''
+        Recomputes node's cached height from its children.
+        Parameters
+        ----------
+        node: BSTNode
+            The node to update.
+        '''
+        node.height = 1 + max(self._height_of(node.left),
+                              self._height_of(node.right))
+
+    def _replace_child(self, parent: BSTNode, old: BSTNode,
+                       new: BSTNode) -> None:
+        '''
+        Makes new take old's place under parent (or as the root).
+        Parameters
+        ----------
+        parent: BSTNode
+            The parent of old, or None if old is the root.
+        old: BSTNode
+            The node being replaced.
+        new: BSTNode
+            The replacement subtree, possibly None.
+        '''
+        if parent is None:
+            self._root = new
+        elif parent.left is old:
+            parent.left = new
+        else:
+            parent.right = new
+        if new:
+            new.parent = parent
+
+    def _rotate_left(self, node: BSTNode) -> BSTNode:
+        '''
+        Rotates node's subtree left and returns the new subtree root.
+        Parameters
+        ----------
+        node: BSTNode
+            The subtree root to rotate.
+        '''
+        pivot = node.right
+        node.right = pivot.left
+        if pivot.left:
+            pivot.left.parent = node
+        self._replace_child(node.parent, node, pivot)
+        pivot.left = node
+        node.parent = pivot
+        self._update_height(node)
+        self._update_height(pivot)
+        return pivot
+
+    def _rotate_right(self, node: BSTNode) -> BSTNode:
+        '''
+        Rotates node's subtree right and returns the new subtree root.
+        Parameters
+        ----------
+        node: BSTNode
+            The subtree root to rotate.
+        '''
+        pivot = node.left
+        node.left = pivot.right
+        if pivot.right:
+            pivot.right.parent = node
+        self._replace_child(node.parent, node, pivot)
+        pivot.right = node
+        node.parent = pivot
+        self._update_height(node)
+        self._update_height(pivot)
+        return pivot
+
+    def _restore_balance(self, node: BSTNode) -> BSTNode:
+        '''
+        Rotates node's subtree back into the AVL shape if its
+        children's heights differ by two, and returns the subtree root.
+        Parameters
+        ----------
+        node: BSTNode
+            The subtree root to check.
+        '''
+        balance = self._height_of(node.left) - self._height_of(node.right)
+        if balance > 1:
+            if self._height_of(node.left.left) < \
+               self._height_of(node.left.right):
+                self._rotate_left(node.left)
+            return self._rotate_right(node)
+        if balance < -1:
+            if self._height_of(node.right.right) < \
+               self._height_of(node.right.left):
+                self._rotate_right(node.right)
+            return self._rotate_left(node)
+        return node
+
+    def _rebalance_up(self, node: BSTNode, stop_when_stable: bool) -> None:
+        '''
+        Walks from node to the root restoring heights and balance.
+        Parameters
+        ----------
+        node: BSTNode
+            The lowest node whose subtree may have changed.
+        stop_when_stable: bool
+            If True, stops as soon as a subtree's height is unchanged
+            (enough after an insertion, not after a removal).
+        '''
+        while node:
+            old_height = node.height
+            self._update_height(node)
+            node = self._restore_balance(node)
+            if stop_when_stable and node.height == old_height:
+                return
+            node = node.parent
+
     def add(self, item: object) -> None:
         """
-        Adds item to the tree.
+        Adds item to the tree, keeping it AVL-balanced.
         Parameters
         ----------
         item: object
             The added item.
         """
 
-        def recurse(node: BSTNode) -> None:
-            '''
-            Helper function to search for item's position.
-            Parameters
-            ----------
-            node: BSTNode
-                The current node.
-            '''
-            if item < node.data:
-                if not node.left:
-                    node.left = BSTNode(item)
-                else:
-                    recurse(node.left)
-            elif not node.right:
-                node.right = BSTNode(item)
-            else:
-                recurse(node.right)
-
-        if self.isEmpty():
+        if self._root is None:
             self._root = BSTNode(item)
         else:
-            recurse(self._root)
+            node = self._root
+            while True:
+                if item < node.data:
+                    if not node.left:
+                        node.left = BSTNode(item, parent=node)
+                        break
+                    node = node.left
+                elif not node.right:
+                    node.right = BSTNode(item, parent=node)
+                    break
+                else:
+                    node = node.right
+            self._rebalance_up(node, stop_when_stable=True)
+        self._sorted_items = None
+        self._compiled = None
         self._size += 1
 
     def remove(self, item: object) -> None:
@@ -206,10 +393,7 @@ class LinkedBST(AbstractCollection):
         item: object
             The removed item.
         """
-        if not item in self:
-            raise KeyError("Item not in tree.""")
-
-        def lift_max_in_left_subtree_to_top(top: BSTNode) -> None:
+        def lift_max_in_left_subtree_to_top(top: BSTNode) -> BSTNode:
             '''
             Helper function to adjust placement of an item.
             Replace top's datum with the maximum datum in the left subtree
@@ -217,6 +401,7 @@ class LinkedBST(AbstractCollection):
             Post: the maximum node in top's left subtree
                   has been removed
             Post: top.data = maximum value in top's left subtree
+            Returns the parent of the spliced-out node.
             Parameters
             ----------
             top: BSTNode
@@ -232,51 +417,35 @@ class LinkedBST(AbstractCollection):
                 top.left = current_node.left
             else:
                 parent.right = current_node.left
+            if current_node.left:
+                current_node.left.parent = parent
+            return parent
 
-        if self.isEmpty():
-            return None
-
-        item_removed = None
-        pre_root = BSTNode(None)
-        pre_root.left = self._root
-        parent = pre_root
-        direction = 'L'
         current_node = self._root
-        while current_node:
-            if current_node.data == item:
-                item_removed = current_node.data
-                break
-            parent = current_node
-            if current_node.data > item:
-                direction = 'L'
+        while current_node and current_node.data != item:
+            if item < current_node.data:
                 current_node = current_node.left
             else:
-                direction = 'R'
                 current_node = current_node.right
-
-        if not item_removed:
-            return None
+        if current_node is None:
+            raise KeyError("Item not in tree.""")
+        item_removed = current_node.data
 
         if current_node.left and current_node.right:
-            lift_max_in_left_subtree_to_top(current_node)
+            unbalanced = lift_max_in_left_subtree_to_top(current_node)
         else:
-
             if not current_node.left:
                 new_child = current_node.right
-
             else:
                 new_child = current_node.left
+            unbalanced = current_node.parent
+            self._replace_child(current_node.parent, current_node, new_child)
 
-            if direction == 'L':
-                parent.left = new_child
-            else:
-                parent.right = new_child
-
+        if unbalanced:
+            self._rebalance_up(unbalanced, stop_when_stable=False)
+        self._sorted_items = None
+        self._compiled = None
         self._size -= 1
-        if self.isEmpty():
-            self._root = None
-        else:
-            self._root = pre_root.left
         return item_removed
 
     def replace(self, item: object, new_item: object) -> object:
@@ -295,6 +464,8 @@ class LinkedBST(AbstractCollection):
             if probe.data == item:
                 old_data = probe.data
                 probe.data = new_item
+                self._sorted_items = None
+                self._compiled = None
                 return old_data
             if probe.data > item:
                 probe = probe.left
@@ -304,47 +475,28 @@ class LinkedBST(AbstractCollection):
 
     def height(self) -> int:
         '''
-        Return the height of tree
+        Return the height of tree, read from the root's cached height
+        maintained by add/remove/rebalance.
         '''
-        def height1(top: BSTNode) -> int:
-            '''
-            Helper function for founding the tree height.
-            Parameters
-            ----------
-            top: BSTNode
-                The current top.
-            '''
-            if not top:
-                return 0
-            return max(height1(top.left), height1(top.right)) + 1
-
-        return height1(self._root) - 1
+        return self._root.height if self._root else -1
 
     def num_vert(self) -> int:
         '''
         Returns the number of vertixes in the tree.
         '''
-        def num_nasch(top: BSTNode) -> int:
-            '''
-            Returns the number of all children of the top.
-            Parameters
-            ----------
-            top: BSTNode
-                The current top.
-            '''
-            children = 0
-            if top.left:
-                children += 1 + num_nasch(top.left)
-            if top.right:
-                children += 1 + num_nasch(top.right)
-            return children
-        return num_nasch(self._root) + 1
+        return self._size
 
     def is_balanced(self) -> bool:
         '''
-        Return True if tree is balanced.
+        Return True if tree is balanced, i.e. its height is below
+        2 * log2(n + 1) - 1.  The threshold is memoized per size, so
+        repeated checks on a stable tree skip the libm call.
         '''
-        return self.height() < 2 * log(self.num_vert() + 1) - 1
+        cached = self._balance_threshold
+        if cached is None or cached[0] != self._size:
+            cached = (self._size, 2 * log2(self._size + 1) - 1)
+            self._balance_threshold = cached
+        return self.height() < cached[1]
 
     def range_find(self, low: object, high: object) -> list:
         '''
@@ -356,23 +508,56 @@ class LinkedBST(AbstractCollection):
         high: object
             The maximum possible item in the returned list.
         '''
-        lyst = self.inorder()
-        return list(filter(lambda x: low <= x <= high, lyst))
+        lyst = []
+        stack = []
+        node = self._root
+        while stack or node:
+            if node:
+                stack.append(node)
+                node = node.left if low <= node.data else None
+            else:
+                node = stack.pop()
+                if low <= node.data <= high:
+                    lyst.append(node.data)
+                node = node.right if node.data <= high else None
+        return lyst
 
     def rebalance(self) -> None:
         '''
         Rebalances the tree.
         '''
         lyst = self.inorder()
-        self.clear()
 
-        def recurs(lyst, tree):
-            if lyst:
-                elem = lyst[len(lyst) // 2]
-                tree.add(elem)
-                recurs(lyst[0:len(lyst) // 2], tree)
-                recurs(lyst[len(lyst) // 2 + 1:], tree)
-        recurs(lyst, self)
+        def build(low: int, high: int) -> BSTNode:
+            '''
+            Builds a perfectly balanced subtree from lyst[low:high]
+            and returns its root.
+            Parameters
+            ----------
+            low: int
+                The first index of the slice (inclusive).
+            high: int
+                The last index of the slice (exclusive).
+            '''
+            if low >= high:
+                return None
+            mid = (low + high) // 2
+            node = BSTNode(lyst[mid])
+            node.left = build(low, mid)
+            node.right = build(mid + 1, high)
+            height = -1
+            if node.left:
+                node.left.parent = node
+                height = node.left.height
+            if node.right:
+                node.right.parent = node
+                height = max(height, node.right.height)
+            node.height = height + 1
+            return node
+
+        self._root = build(0, len(lyst))
+        self._size = len(lyst)
+        self._compile()
         return self
 
     def successor(self, item: object) -> object:
@@ -384,21 +569,15 @@ class LinkedBST(AbstractCollection):
         item: object
             The successor item.
         """
-        top = self._root
-
-        def recurs(top):
-            if top:
-                if top.data <= item:
-                    answ = recurs(top.right)
-                    if answ:
-                        return answ
-                    return None
-                answ = recurs(top.left)
-                if answ:
-                    return answ
-                return top.data
-            return None
-        return recurs(top)
+        best = None
+        probe = self._root
+        while probe is not None:
+            if probe.data > item:
+                best = probe.data
+                probe = probe.left
+            else:
+                probe = probe.right
+        return best
 
     def predecessor(self, item: object) -> object:
         """
@@ -409,21 +588,15 @@ class LinkedBST(AbstractCollection):
         item: object
             The predecessor item.
         """
-        top = self._root
-
-        def recurs(top):
-            if top:
-                if top.data >= item:
-                    answ = recurs(top.left)
-                    if answ:
-                        return answ
-                    return None
-                answ = recurs(top.right)
-                if answ:
-                    return answ
-                return top.data
-            return None
-        return recurs(top)
+        best = None
+        probe = self._root
+        while probe is not None:
+            if probe.data < item:
+                best = probe.data
+                probe = probe.right
+            else:
+                probe = probe.left
+        return best
 
     def demo_bst(self, input_file: str) -> None:
         '''
@@ -434,45 +607,40 @@ class LinkedBST(AbstractCollection):
         input_file: str
             The analysed file.
         '''
-        def search_time(words, tree):
+        def search_time(samples, tree):
             '''
-            Returns the searching time for 10000 random words in given tree.
+            Returns the searching time for the sampled words in given tree.
             Parameters
             ----------
-            words: list
-                The words list.
+            samples: list
+                The words to search for.
             tree: LinkedBST
                 The tree.
             '''
-            start_time = time()
-            for _ in range(10000):
-                word = choice(words)
+            start_time = perf_counter()
+            for word in samples:
                 tree.find(word)
-            return time() - start_time
+            return perf_counter() - start_time
 
-        words = []
         with open(input_file) as fin:
-            word = fin.readline()
-            while word:
-                words.append(word)
-                word = fin.readline()
-        if len(words) > 1000:
-            words = words[:1000]
+            words = [line.rstrip() for line in fin][:1000]
+
+        samples = choices(words, k=10000)
+        sorted_words = sorted(words)
 
         self.clear()
         for word in words:
             self.add(word)
 
-        start_time = time()
-        for _ in range(10000):
-            word = choice(words)
-            words.index(word)
+        start_time = perf_counter()
+        for word in samples:
+            bisect_left(sorted_words, word)
         print('Час пошуку 10000 випадкових слів у впорядкованому за абеткою словнику:',
-              f'{time() - start_time}.')
+              f'{perf_counter() - start_time}.')
 
         print('Час пошуку 10000 випадкових слів у словнику, який представлений у вигляді ' +
               'бінарного дерева пошуку (побудовона нa основі словника, відсортованого за' +
-              f' алфавітом): {search_time(words, self)}.')
+              f' алфавітом): {search_time(samples, self)}.')
 
         self.clear()
         shuffle(words)
@@ -481,8 +649,13 @@ class LinkedBST(AbstractCollection):
 
         print('Час пошуку 10000 випадкових слів у словнику, який представлений у вигляді ' +
               'бінарного дерева пошуку (побудовона нa основі словника, не відсортованого за' +
-              f' алфавітом): {search_time(words, self)}.')
+              f' алфавітом): {search_time(samples, self)}.')
 
         self.rebalance()
         print('Час пошуку 10000 випадкових слів у словнику, який представлений у вигляді ' +
-              f'збалансованого бінарного дерева пошуку: {search_time(words, self)}.')
+              f'збалансованого бінарного дерева пошуку: {search_time(samples, self)}.')
+
+        start_time = perf_counter()
+        self.find_many(samples)
+        print('Час пакетного пошуку 10000 випадкових слів (find_many):',
+              f'{perf_counter() - start_time}.')
@@ -20,15 +20,12 @@ class LinkedStack(AbstractStack):
     # Accessor methods
     def __iter__(self):
         """Supports iteration over a view of self."""
-
-        def visit_nodes(node):
-            """Adds items to temp_list from tail to head."""
-            if not node is None:
-                visit_nodes(node.next)
-                temp_list.append(node.data)
-
-        temp_list = list()
-        visit_nodes(self._items)
+        temp_list = []
+        node = self._items
+        while node is not None:
+            temp_list.append(node.data)
+            node = node.next
+        temp_list.reverse()
         return iter(temp_list)
 
     def peek(self):